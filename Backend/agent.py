@@ -2,41 +2,91 @@
 agent.py - Simplified AI Agent (Groq optional)
 """
 
-from datetime import datetime
-from typing import Dict, Any
-import json
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+import asyncio
+import hashlib
+import logging
+
+import orjson
+
+from sqlalchemy.orm import Session
 
 # ----------------- TOOLS -----------------
 
 from tools import TOOLS
+from text_stats import count_words_and_symptoms
+
+logger = logging.getLogger("crm")
+
+# ----------------- PROMPT -----------------
+
+# Kept identical across calls so the provider can reuse the cached prefix;
+# only the human message carries per-interaction text
+STATIC_SYSTEM_PROMPT = """
+You are a healthcare CRM AI assistant. Analyze the doctor interaction in the user message.
+
+Provide a brief summary and 2-3 actionable insights.
+Format as JSON with keys: summary, insights (list), confidence_score.
+"""
 
 # Try to import Groq, but make it optional
 try:
     from langchain_groq import ChatGroq
+    from langchain_core.prompts import ChatPromptTemplate
     from dotenv import load_dotenv
+    import httpx
     import os
     
     load_dotenv()
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     
     if GROQ_API_KEY:
+        # One pooled client for every Groq call: TLS handshakes are paid once
+        # and concurrent requests share (or multiplex over) open connections
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        try:
+            HTTP_CLIENT = httpx.AsyncClient(http2=True, limits=limits)
+        except ImportError:
+            # http2=True needs the optional h2 package
+            HTTP_CLIENT = httpx.AsyncClient(limits=limits)
+        
         llm = ChatGroq(
             api_key=GROQ_API_KEY,
             model_name="llama-3.3-70b-versatile",
             temperature=0.2,
-            max_tokens=512
+            max_tokens=512,
+            http_async_client=HTTP_CLIENT
         )
+        
+        # Template parsed once at import; each call only fills in {text}
+        PROMPT = ChatPromptTemplate.from_messages([
+            ("system", STATIC_SYSTEM_PROMPT),
+            ("human", "{text}")
+        ])
+        CHAIN = PROMPT | llm
         GROQ_AVAILABLE = True
-        print("✅ Groq LLM initialized successfully")
+        logger.info("✅ Groq LLM initialized successfully")
     else:
         GROQ_AVAILABLE = False
-        print("⚠️  Groq API key not found, using mock AI responses")
+        logger.warning("⚠️  Groq API key not found, using mock AI responses")
 except ImportError:
     GROQ_AVAILABLE = False
-    print("⚠️  langchain_groq not installed, using mock AI responses")
+    logger.warning("⚠️  langchain_groq not installed, using mock AI responses")
 except Exception as e:
     GROQ_AVAILABLE = False
-    print(f"⚠️  Failed to initialize Groq: {e}, using mock AI responses")
+    logger.warning("⚠️  Failed to initialize Groq: %s, using mock AI responses", e)
+
+# ----------------- CACHE -----------------
+
+from cache import SemanticCache, create_embedder
+
+# Loaded once per process, and only worth it when real LLM calls are made
+EMBEDDER = create_embedder() if GROQ_AVAILABLE else None
+semantic_cache = SemanticCache(embedder=EMBEDDER) if GROQ_AVAILABLE else None
+
+# Futures for LLM calls currently in flight, keyed by prompt hash
+INFLIGHT: Dict[bytes, asyncio.Future] = {}
 
 # ----------------- AGENT -----------------
 
@@ -47,10 +97,10 @@ class Agent:
 
     def __init__(self):
         self.tools = TOOLS
-        print("🤖 AI Healthcare CRM Agent Initialized")
+        logger.info("🤖 AI Healthcare CRM Agent Initialized")
 
-    def process_interaction(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        print(f"\n🚀 Processing interaction: {input_data.get('mode', 'form')} mode")
+    async def process_interaction(self, input_data: Dict[str, Any], db: Session) -> Dict[str, Any]:
+        logger.debug("🚀 Processing interaction: %s mode", input_data.get("mode", "form"))
 
         try:
             # Always use log_interaction tool for now
@@ -64,7 +114,7 @@ class Agent:
                 }
 
             # Execute tool
-            tool_result = tool(input_data)
+            tool_result = tool(db, input_data)
 
             if not tool_result.get("success", False):
                 return {
@@ -73,8 +123,26 @@ class Agent:
                     "tool_result": tool_result
                 }
 
+            pending_write = tool_result.pop("pending_write", None)
+
             # Generate AI insights (real or mock)
-            ai_insights = self.generate_ai_summary(input_data, tool_result)
+            summary = asyncio.ensure_future(self.generate_ai_summary(input_data, tool_result))
+
+            # Queued writes are only acknowledged once their batch has committed;
+            # the commit wait overlaps the LLM round-trip
+            if pending_write is not None:
+                try:
+                    await pending_write
+                except Exception as e:
+                    summary.cancel()
+                    logger.error("❌ Queued write failed: %s", e)
+                    return {
+                        "success": False,
+                        "message": f"Failed to save interaction: {str(e)}",
+                        "interaction_id": tool_result.get("interaction_id")
+                    }
+
+            ai_insights = await summary
 
             # Return Response
             response = {
@@ -82,16 +150,14 @@ class Agent:
                 "tool_used": tool_name,
                 "tool_result": tool_result,
                 "ai_insights": ai_insights,
-                "processed_at": datetime.utcnow().isoformat()
+                "processed_at": datetime.now(timezone.utc)
             }
 
-            print(f"✅ Successfully processed interaction")
+            logger.debug("✅ Successfully processed interaction")
             return response
 
         except Exception as e:
-            print(f"❌ Agent Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Agent Error: %s", e)
             
             return {
                 "success": False,
@@ -99,11 +165,47 @@ class Agent:
                 "message": "Internal server error"
             }
 
-    def generate_ai_summary(self, input_data, tool_result):
+    async def summarize_with_llm(self, prompt: str, generated_at: datetime, embedding=None) -> Dict[str, Any]:
+        """
+        Call Groq for one prompt, parse the insights and store them in the semantic cache
+        """
+        response = await CHAIN.ainvoke({"text": prompt})
+        
+        # Try to parse JSON response
+        try:
+            ai_response = orjson.loads(response.content)
+            ai_insights = {
+                "summary": ai_response.get("summary", "AI analysis completed"),
+                "insights": ai_response.get("insights", ["No specific insights generated"]),
+                "confidence_score": ai_response.get("confidence_score", 0.85),
+                "ai_model": "llama3-8b-8192",
+                "generated_at": generated_at,
+                "is_real_ai": True
+            }
+        except orjson.JSONDecodeError:
+            # If not JSON, use raw content
+            ai_insights = {
+                "summary": response.content[:200],
+                "insights": [
+                    "AI generated insights from clinical notes",
+                    "Recommend reviewing diagnosis accuracy",
+                    "Schedule appropriate follow-up"
+                ],
+                "confidence_score": 0.88,
+                "ai_model": "llama3-8b-8192",
+                "generated_at": generated_at,
+                "is_real_ai": True
+            }
+
+        await semantic_cache.set(prompt, ai_insights, embedding)
+        return ai_insights
+
+    async def generate_ai_summary(self, input_data, tool_result):
         """
         Generate AI insights (uses Groq if available, otherwise mock)
         """
-        print("🧠 Generating AI insights...")
+        logger.debug("🧠 Generating AI insights...")
+        generated_at = datetime.now(timezone.utc)
 
         if GROQ_AVAILABLE:
             try:
@@ -111,47 +213,47 @@ class Agent:
                 if input_data.get("mode") == "chat":
                     text = input_data.get("notes", "")
                 else:
-                    text = json.dumps(input_data)
+                    # Sorted keys keep identical forms producing identical prompts
+                    text = orjson.dumps(input_data, option=orjson.OPT_SORT_KEYS).decode()
 
-                prompt = f"""
-You are a healthcare CRM AI assistant. Analyze this doctor interaction:
+                prompt = text[:2000]  # Limit text length
 
-{text[:2000]}  # Limit text length
+                # Form payloads carry patient_id/symptoms/diagnosis: near-identical
+                # forms for different patients must never share a summary, so
+                # only free-text chat notes are matched by similarity
+                fuzzy = input_data.get("mode") == "chat"
 
-Provide a brief summary and 2-3 actionable insights.
-Format as JSON with keys: summary, insights (list), confidence_score.
-"""
+                cached, embedding = await semantic_cache.get(prompt, fuzzy=fuzzy)
+                if cached is not None:
+                    logger.debug("⚡ Semantic cache hit")
+                    return {**cached, "generated_at": generated_at}
 
-                response = llm.invoke(prompt)
-                
-                # Try to parse JSON response
+                # Single-flight: identical prompts already in flight share one LLM call
+                key = hashlib.sha256(prompt.encode()).digest()
+                inflight = INFLIGHT.get(key)
+                if inflight is not None:
+                    logger.debug("⏳ Joining in-flight LLM call")
+                    return {**(await asyncio.shield(inflight)), "generated_at": generated_at}
+
+                future = asyncio.get_running_loop().create_future()
+                # Mark failures as retrieved even when no duplicate was waiting
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                INFLIGHT[key] = future
                 try:
-                    ai_response = json.loads(response.content)
-                    return {
-                        "summary": ai_response.get("summary", "AI analysis completed"),
-                        "insights": ai_response.get("insights", ["No specific insights generated"]),
-                        "confidence_score": ai_response.get("confidence_score", 0.85),
-                        "ai_model": "llama3-8b-8192",
-                        "generated_at": datetime.utcnow().isoformat(),
-                        "is_real_ai": True
-                    }
-                except json.JSONDecodeError:
-                    # If not JSON, use raw content
-                    return {
-                        "summary": response.content[:200],
-                        "insights": [
-                            "AI generated insights from clinical notes",
-                            "Recommend reviewing diagnosis accuracy",
-                            "Schedule appropriate follow-up"
-                        ],
-                        "confidence_score": 0.88,
-                        "ai_model": "llama3-8b-8192",
-                        "generated_at": datetime.utcnow().isoformat(),
-                        "is_real_ai": True
-                    }
+                    ai_insights = await self.summarize_with_llm(prompt, generated_at, embedding)
+                    future.set_result(ai_insights)
+                    return ai_insights
+                except Exception as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    if not future.done():
+                        # Cancelled mid-call; release any duplicates waiting on it
+                        future.set_exception(RuntimeError("In-flight LLM call was cancelled"))
+                    INFLIGHT.pop(key, None)
                     
             except Exception as e:
-                print(f"⚠️  Groq API error, falling back to mock: {e}")
+                logger.warning("⚠️  Groq API error, falling back to mock: %s", e)
                 # Fall through to mock response
 
         # Mock AI response (fallback)
@@ -159,10 +261,10 @@ Format as JSON with keys: summary, insights (list), confidence_score.
         
         if mode == "chat":
             notes = input_data.get("notes", "")
-            word_count = len(notes.split())
+            word_count, symptom_mentions = count_words_and_symptoms(notes)
             
             return {
-                "summary": f"Analyzed {word_count} words of clinical notes. Patient presents with common symptoms requiring follow-up.",
+                "summary": f"Analyzed {word_count} words of clinical notes ({symptom_mentions} symptom mentions). Patient presents with common symptoms requiring follow-up.",
                 "insights": [
                     "Suggested follow-up in 1-2 weeks",
                     "Monitor for symptom progression",
@@ -175,7 +277,7 @@ Format as JSON with keys: summary, insights (list), confidence_score.
                     "Update patient medication list"
                 ],
                 "ai_model": "Mock AI (Groq not available)",
-                "generated_at": datetime.utcnow().isoformat(),
+                "generated_at": generated_at,
                 "is_real_ai": False
             }
         else:
@@ -195,7 +297,7 @@ Format as JSON with keys: summary, insights (list), confidence_score.
                     "Schedule next appointment"
                 ],
                 "ai_model": "Mock AI (Groq not available)",
-                "generated_at": datetime.utcnow().isoformat(),
+                "generated_at": generated_at,
                 "is_real_ai": False
             }
 
@@ -203,5 +305,14 @@ Format as JSON with keys: summary, insights (list), confidence_score.
 # Global Agent Instance
 agent = Agent()
 
-def process_interaction(input_data: Dict[str, Any]) -> Dict[str, Any]:
-    return agent.process_interaction(input_data)
\ No newline at end of file
+async def close_clients():
+    """Close the shared Groq HTTP client (called on app shutdown)"""
+    if GROQ_AVAILABLE:
+        await HTTP_CLIENT.aclose()
+
+async def process_interaction(input_data: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    return await agent.process_interaction(input_data, db)
+
+async def process_interactions_batch(batch: List[Dict[str, Any]], db: Session) -> List[Dict[str, Any]]:
+    """Process several interactions concurrently so their LLM calls overlap"""
+    return await asyncio.gather(*[agent.process_interaction(x, db) for x in batch])
@@ -0,0 +1,216 @@
+"""
+cache.py - Semantic cache for LLM responses
+Exact prompt-hash lookups first, then cosine similarity over prompt embeddings
+"""
+
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+
+import orjson
+
+from database import SessionLocal, LLMCacheEntry, utcnow
+
+logger = logging.getLogger("crm")
+
+# Try to import embedding support, but make it optional
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+    logger.warning("⚠️  sentence-transformers not installed, semantic cache uses exact matches only")
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def create_embedder():
+    """Load the embedding model, or None when unavailable (exact matches only)"""
+    if not EMBEDDINGS_AVAILABLE:
+        return None
+    try:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning("⚠️  Failed to load embedding model: %s, using exact matches only", e)
+        return None
+
+
+class SemanticCache:
+    """
+    Intercept -> vectorize -> search -> decide cache in front of the LLM
+    Entries are persisted in SQLite and expire after ttl_hours. Fuzzy matching
+    is opt-in per prompt: payloads carrying patient identifiers must only ever
+    hit on an exact match.
+    """
+
+    def __init__(self, embedder=None, threshold: float = 0.92, ttl_hours: int = 24):
+        self.threshold = threshold
+        self.ttl = timedelta(hours=ttl_hours)
+
+        # Insertion order is created_at order, so expired entries come first
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        # Embedding rows live in a preallocated buffer that doubles when full;
+        # only the first `size` rows are in use. Evicted rows are left as
+        # tombstones (hash None) until enough pile up to compact in one pass.
+        self.matrix = None
+        self.size = 0
+        self.dead = 0
+        self.hashes: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.embedder = embedder
+
+    @staticmethod
+    def key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def _embed(self, prompt: str):
+        if self.embedder is None:
+            return None
+        return self.embedder.encode(prompt, normalize_embeddings=True).astype(np.float32)
+
+    def load(self):
+        """Sweep expired rows and load the rest into memory (call after init_db)"""
+        db = SessionLocal()
+        try:
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < utcnow() - self.ttl).delete()
+            db.commit()
+
+            vectors = []
+            for entry in db.query(LLMCacheEntry).order_by(LLMCacheEntry.created_at).all():
+                self.entries[entry.hash] = {
+                    "response": orjson.loads(entry.response),
+                    "created_at": entry.created_at
+                }
+                if self.embedder is not None and entry.embedding:
+                    self.rows[entry.hash] = len(self.hashes)
+                    self.hashes.append(entry.hash)
+                    vectors.append(np.frombuffer(entry.embedding, dtype=np.float32))
+
+            if vectors:
+                self.matrix = np.vstack(vectors)
+                self.size = len(vectors)
+
+            logger.info("🗄  Semantic cache loaded %d entries", len(self.entries))
+        except Exception as e:
+            db.rollback()
+            logger.warning("⚠️  Failed to load semantic cache: %s", e)
+        finally:
+            db.close()
+
+    def _evict_expired(self):
+        """Drop expired entries from memory and tombstone their embedding rows"""
+        now = utcnow()
+        expired = []
+        for entry_hash, entry in self.entries.items():
+            if now - entry["created_at"] < self.ttl:
+                break
+            expired.append(entry_hash)
+
+        for entry_hash in expired:
+            del self.entries[entry_hash]
+            row = self.rows.pop(entry_hash, None)
+            if row is not None:
+                self.hashes[row] = None
+                self.dead += 1
+
+        # Compact once half the rows are dead, not on every eviction
+        if self.dead and self.dead * 2 >= self.size:
+            keep = [i for i in range(self.size) if self.hashes[i] is not None]
+            self.hashes = [self.hashes[i] for i in keep]
+            self.rows = {h: i for i, h in enumerate(self.hashes)}
+            self.matrix = self.matrix[keep] if keep else None
+            self.size = len(keep)
+            self.dead = 0
+
+    def _add_row(self, entry_hash: str, embedding):
+        """Write an embedding row, growing the buffer by doubling when full"""
+        row = self.rows.get(entry_hash)
+        if row is not None:
+            self.matrix[row] = embedding
+            return
+
+        if self.matrix is None:
+            self.matrix = np.empty((64, embedding.shape[0]), dtype=np.float32)
+        elif self.size == self.matrix.shape[0]:
+            grown = np.empty((self.size * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+
+        self.matrix[self.size] = embedding
+        self.rows[entry_hash] = self.size
+        self.hashes.append(entry_hash)
+        self.size += 1
+
+    def _fresh(self, entry_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(entry_hash)
+        if entry and utcnow() - entry["created_at"] < self.ttl:
+            return entry["response"]
+        return None
+
+    async def get(self, prompt: str, fuzzy: bool = True) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """
+        Return (cached response or None, prompt embedding or None)
+        Exact hash first; if fuzzy, a close paraphrase. The embedding is handed
+        back so set() can reuse it instead of encoding the prompt again.
+        """
+        cached = self._fresh(self.key(prompt))
+        if cached is not None:
+            return cached, None
+
+        if not fuzzy or self.embedder is None:
+            return None, None
+
+        # Encoding is CPU-bound; keep it off the event loop
+        embedding = await asyncio.to_thread(self._embed, prompt)
+        if self.size == 0:
+            return None, embedding
+
+        scores = np.dot(self.matrix[:self.size], embedding)
+
+        # Best fresh candidate above the threshold; expired and evicted rows are skipped
+        for i in np.argsort(scores)[::-1]:
+            if scores[i] < self.threshold:
+                break
+            cached = self._fresh(self.hashes[i])
+            if cached is not None:
+                return cached, embedding
+        return None, embedding
+
+    async def set(self, prompt: str, response: Dict[str, Any], embedding=None):
+        """Store a response in memory and in SQLite (exact-match only without an embedding)"""
+        entry_hash = self.key(prompt)
+        now = utcnow()
+
+        self._evict_expired()
+
+        if embedding is not None:
+            self._add_row(entry_hash, embedding)
+
+        # Re-inserted at the end so entries stay in created_at order
+        self.entries.pop(entry_hash, None)
+        self.entries[entry_hash] = {"response": response, "created_at": now}
+
+        await asyncio.to_thread(self._persist, entry_hash, embedding, response, now)
+
+    def _persist(self, entry_hash: str, embedding, response: Dict[str, Any], created_at):
+        db = SessionLocal()
+        try:
+            db.merge(LLMCacheEntry(
+                hash=entry_hash,
+                embedding=embedding.tobytes() if embedding is not None else None,
+                response=orjson.dumps(response).decode(),
+                created_at=created_at
+            ))
+            # Sweep expired rows on write too, not only at startup
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < created_at - self.ttl).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("⚠️  Failed to persist cache entry: %s", e)
+        finally:
+            db.close()
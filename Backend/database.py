@@ -3,23 +3,74 @@ database.py - Mock database for Healthcare CRM
 Handles patient interaction data storage and retrieval using SQLAlchemy ORM
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import create_engine, event, text, Column, Integer, String, Text, DateTime, Boolean, LargeBinary
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timedelta
+from sqlalchemy.pool import QueuePool
+from datetime import datetime, timedelta, timezone
 import uuid
 import os
+import logging
+
+logger = logging.getLogger("crm")
+
+def utcnow():
+    """Timezone-aware current UTC time (datetime.utcnow is deprecated)"""
+    return datetime.now(timezone.utc)
+
+class UTCDateTime(TypeDecorator):
+    """
+    DateTime stored as naive UTC (SQLite keeps no offset) and always read back
+    timezone-aware, so every endpoint emits the same RFC 3339 form
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
 
 # Create SQLite database file in current directory
 DB_PATH = "healthcare_crm.db"
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
 # Ensure database file is created
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20
+)
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new pooled SQLite connection once, when it is opened"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_db():
+    """FastAPI dependency - yields a pooled session and closes it after the request"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # Base class for ORM models
 Base = declarative_base()
 
@@ -33,33 +84,33 @@ class PatientInteraction(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     patient_id = Column(String, index=True, nullable=True)
     interaction_type = Column(String, default="consultation")
-    interaction_date = Column(DateTime, default=datetime.utcnow)
+    interaction_date = Column(UTCDateTime, default=utcnow)
     duration_minutes = Column(Integer, nullable=True)
     symptoms = Column(Text, nullable=True)
     diagnosis = Column(String, nullable=True)
     prescription = Column(String, nullable=True)
-    follow_up_date = Column(DateTime, nullable=True)
+    follow_up_date = Column(UTCDateTime, nullable=True)
     chat_notes = Column(Text, nullable=True)
     is_compliant = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(UTCDateTime, default=utcnow, index=True)
+    updated_at = Column(UTCDateTime, default=utcnow, onupdate=utcnow)
     
     def to_dict(self):
-        """Convert interaction to dictionary for API responses"""
+        """Convert interaction to dictionary for API responses (datetimes left for orjson)"""
         return {
             "id": self.id,
             "patient_id": self.patient_id,
             "interaction_type": self.interaction_type,
-            "interaction_date": self.interaction_date.isoformat() if self.interaction_date else None,
+            "interaction_date": self.interaction_date,
             "duration_minutes": self.duration_minutes,
             "symptoms": self.symptoms,
             "diagnosis": self.diagnosis,
             "prescription": self.prescription,
-            "follow_up_date": self.follow_up_date.isoformat() if self.follow_up_date else None,
+            "follow_up_date": self.follow_up_date,
             "chat_notes": self.chat_notes,
             "is_compliant": self.is_compliant,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
         }
 
 class HCPProfile(Base):
@@ -89,102 +140,119 @@ class HCPProfile(Base):
             "contact_email": self.contact_email
         }
 
+class LLMCacheEntry(Base):
+    """
+    Semantic cache entry for LLM responses
+    Keyed by prompt hash, with the prompt embedding kept for similarity lookups
+    """
+    __tablename__ = "llm_cache"
+    
+    hash = Column(String, primary_key=True)
+    embedding = Column(LargeBinary, nullable=True)
+    response = Column(Text, nullable=False)
+    created_at = Column(UTCDateTime, default=utcnow, index=True)
+
 def init_db():
     """
     Initialize database - create tables and seed with mock data
     """
-    print(f"🚀 Initializing database at {DB_PATH}...")
+    logger.info("🚀 Initializing database at %s...", DB_PATH)
     
     try:
         # Create all tables
         Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created successfully!")
+        
+        # create_all skips indexes on tables that already exist
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_patient_interactions_created_at "
+                "ON patient_interactions (created_at)"
+            ))
+        logger.info("✅ Database tables created successfully!")
         
         # Create database session
         db = SessionLocal()
         
         try:
-            # Check if we need to seed mock data
-            existing_interactions = db.query(PatientInteraction).count()
-            existing_hcps = db.query(HCPProfile).count()
+            # Check if we need to seed mock data - LIMIT 1 probes instead of COUNT(*) scans
+            has_interactions = db.execute(text("SELECT 1 FROM patient_interactions LIMIT 1")).first() is not None
+            has_hcps = db.execute(text("SELECT 1 FROM hcp_profiles LIMIT 1")).first() is not None
             
             # Seed mock HCP data if table is empty
-            if existing_hcps == 0:
-                print("📋 Seeding mock HCP data...")
+            if not has_hcps:
+                logger.info("📋 Seeding mock HCP data...")
                 mock_hcps = [
-                    HCPProfile(
-                        name="Dr. Sarah Johnson",
-                        specialization="Cardiology",
-                        license_number="MD123456",
-                        hospital_affiliation="General Hospital",
-                        years_of_experience=12,
-                        contact_email="sarah.johnson@hospital.com"
-                    ),
-                    HCPProfile(
-                        name="Dr. Michael Chen",
-                        specialization="Pediatrics",
-                        license_number="MD789012",
-                        hospital_affiliation="Children's Medical Center",
-                        years_of_experience=8,
-                        contact_email="michael.chen@childrenshospital.com"
-                    ),
-                    HCPProfile(
-                        name="Dr. Lisa Rodriguez",
-                        specialization="Neurology",
-                        license_number="MD345678",
-                        hospital_affiliation="Neuro Center",
-                        years_of_experience=15,
-                        contact_email="lisa.rodriguez@neurocenter.com"
-                    )
+                    {
+                        "name": "Dr. Sarah Johnson",
+                        "specialization": "Cardiology",
+                        "license_number": "MD123456",
+                        "hospital_affiliation": "General Hospital",
+                        "years_of_experience": 12,
+                        "contact_email": "sarah.johnson@hospital.com"
+                    },
+                    {
+                        "name": "Dr. Michael Chen",
+                        "specialization": "Pediatrics",
+                        "license_number": "MD789012",
+                        "hospital_affiliation": "Children's Medical Center",
+                        "years_of_experience": 8,
+                        "contact_email": "michael.chen@childrenshospital.com"
+                    },
+                    {
+                        "name": "Dr. Lisa Rodriguez",
+                        "specialization": "Neurology",
+                        "license_number": "MD345678",
+                        "hospital_affiliation": "Neuro Center",
+                        "years_of_experience": 15,
+                        "contact_email": "lisa.rodriguez@neurocenter.com"
+                    }
                 ]
-                db.add_all(mock_hcps)
+                db.bulk_insert_mappings(HCPProfile, mock_hcps)
                 db.commit()
-                print(f"✅ Added {len(mock_hcps)} HCP profiles")
+                logger.info("✅ Added %d HCP profiles", len(mock_hcps))
             
             # Seed mock patient interactions if table is empty
-            if existing_interactions == 0:
-                print("📋 Seeding mock patient interactions...")
+            if not has_interactions:
+                logger.info("📋 Seeding mock patient interactions...")
+                now = utcnow()
                 mock_interactions = [
-                    PatientInteraction(
-                        patient_id="PAT001",
-                        interaction_type="consultation",
-                        interaction_date=datetime.utcnow() - timedelta(days=2),
-                        duration_minutes=30,
-                        symptoms="Fever, cough, headache",
-                        diagnosis="Viral infection",
-                        prescription="Rest, fluids, paracetamol",
-                        follow_up_date=datetime.utcnow() + timedelta(days=7),
-                        chat_notes=None,
-                        is_compliant=True
-                    ),
-                    PatientInteraction(
-                        patient_id="PAT002",
-                        interaction_type="follow-up",
-                        interaction_date=datetime.utcnow() - timedelta(days=1),
-                        duration_minutes=20,
-                        symptoms="Improving, mild cough persists",
-                        diagnosis="Recovering viral infection",
-                        prescription="Continue rest",
-                        follow_up_date=None,
-                        chat_notes=None,
-                        is_compliant=True
-                    )
+                    {
+                        "patient_id": "PAT001",
+                        "interaction_type": "consultation",
+                        "interaction_date": now - timedelta(days=2),
+                        "duration_minutes": 30,
+                        "symptoms": "Fever, cough, headache",
+                        "diagnosis": "Viral infection",
+                        "prescription": "Rest, fluids, paracetamol",
+                        "follow_up_date": now + timedelta(days=7),
+                        "chat_notes": None,
+                        "is_compliant": True
+                    },
+                    {
+                        "patient_id": "PAT002",
+                        "interaction_type": "follow-up",
+                        "interaction_date": now - timedelta(days=1),
+                        "duration_minutes": 20,
+                        "symptoms": "Improving, mild cough persists",
+                        "diagnosis": "Recovering viral infection",
+                        "prescription": "Continue rest",
+                        "follow_up_date": None,
+                        "chat_notes": None,
+                        "is_compliant": True
+                    }
                 ]
-                db.add_all(mock_interactions)
+                db.bulk_insert_mappings(PatientInteraction, mock_interactions)
                 db.commit()
-                print(f"✅ Added {len(mock_interactions)} patient interactions")
+                logger.info("✅ Added %d patient interactions", len(mock_interactions))
             
-            print("🎉 Database initialization complete!")
+            logger.info("🎉 Database initialization complete!")
             
         except Exception as e:
-            print(f"❌ Error seeding data: {e}")
+            logger.error("❌ Error seeding data: %s", e)
             db.rollback()
         finally:
             db.close()
             
     except Exception as e:
-        print(f"❌ Error creating database: {e}")
+        logger.error("❌ Error creating database: %s", e)
         raise
-
-# Initialize database on import
-init_db()
\ No newline at end of file
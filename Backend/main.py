@@ -3,14 +3,41 @@ main.py - FastAPI server for Healthcare CRM backend
 Main entry point for the application
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+import logging
+import orjson
 import uvicorn
-from datetime import datetime
-from agent import process_interaction
-import json
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+# INFO by default so per-request debug dumps cost nothing. Configured before
+# the local imports below so their startup messages are not lost.
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("crm")
+
+from agent import process_interaction, close_clients, semantic_cache
+from database import init_db, get_db, SessionLocal, PatientInteraction, HCPProfile
+from writer import interaction_writer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup: create tables and seed data (once, not on every import), load the
+    semantic cache and start the batch writer. Shutdown: flush and close.
+    """
+    init_db()
+    if semantic_cache is not None:
+        semantic_cache.load()
+    interaction_writer.start()
+    yield
+    await interaction_writer.stop()
+    await close_clients()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -18,7 +45,9 @@ app = FastAPI(
     description="AI-first CRM for Healthcare Professionals",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS for React frontend
@@ -44,8 +73,8 @@ class InteractionRequest(BaseModel):
     prescription: Optional[str] = Field(None, description="Prescribed medication")
     followUpDate: Optional[str] = Field(None, description="Follow-up date in ISO format")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "mode": "chat",
                 "notes": "Patient presented with fever and cough for 3 days. Temperature 38.5°C.",
@@ -59,6 +88,7 @@ class InteractionRequest(BaseModel):
                 "followUpDate": "2024-01-27"
             }
         }
+    )
 
 class HealthCheckResponse(BaseModel):
     """Response model for health check endpoint"""
@@ -77,7 +107,7 @@ async def root():
         "endpoints": {
             "POST /log-interaction": "Log patient interaction",
             "GET /health": "Health check",
-            "GET /interactions": "Get all interactions",
+            "GET /interactions": "Stream interactions as NDJSON (?limit=&cursor=&cursor_id=)",
             "GET /hcps": "Get healthcare professionals"
         }
     }
@@ -87,97 +117,124 @@ async def health_check():
     """Health check endpoint for monitoring"""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "version": "1.0.0",
         "database": "connected"
     }
 
 @app.post("/log-interaction", tags=["Interactions"])
-async def log_interaction(request: InteractionRequest):
+async def log_interaction(request: InteractionRequest, db: Session = Depends(get_db)):
     """
     Main endpoint for logging patient interactions
     Processes interaction through AI agent and returns insights
     """
     try:
-        print(f"📥 Received interaction request: {request.mode} mode")
-        print(f"📝 Request data: {json.dumps(request.dict(), indent=2)}")
+        logger.info("📥 Received interaction request: %s mode", request.mode)
+        
+        # Basic validation
+        if request.mode == 'chat' and not request.notes:
+            raise HTTPException(status_code=400, detail="Chat notes are required for chat mode")
         
-        # Convert Pydantic model to dict for processing
-        request_data = request.dict()
+        # Convert Pydantic model to dict once, reused for logging and processing
+        request_data = request.model_dump()
+        logger.debug("📝 Request data: %s", request_data)
         
         # Process through AI agent
-        print("🔍 Sending to AI agent...")
-        result = process_interaction(request_data)
+        logger.debug("🔍 Sending to AI agent...")
+        result = await process_interaction(request_data, db)
         
         if not result.get("success", False):
-            raise HTTPException(status_code=500, detail=result.get("message", "Processing failed"))
+            error_msg = result.get("message") or result.get("error") or "Processing failed"
+            logger.error("❌ Agent failed: %s", error_msg)
+            raise HTTPException(status_code=500, detail=error_msg)
         
+        logger.debug("✅ Agent processing successful")
         return result
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        print(f"💥 Unhandled error in /log-interaction: {e}")
+        logger.exception("💥 Unhandled error in /log-interaction: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
 @app.get("/interactions", tags=["Interactions"])
-async def get_interactions():
-    """Get all interactions from database"""
-    print("📊 Fetching all interactions...")
+async def get_interactions(
+    limit: int = Query(100, ge=1, le=1000, description="Maximum rows to return"),
+    cursor: Optional[datetime] = Query(None, description="created_at of the last row from the previous page"),
+    cursor_id: Optional[str] = Query(None, description="id of the last row from the previous page")
+):
+    """
+    Stream interactions newest first as NDJSON (one JSON object per line)
+    Pass the last row's created_at and id as cursor / cursor_id to fetch the next page
+    """
+    logger.debug("📊 Fetching interactions (limit=%d, cursor=%s, cursor_id=%s)...", limit, cursor, cursor_id)
     
-    from database import SessionLocal, PatientInteraction
+    # Keyset pagination on (created_at, id); id breaks ties between rows
+    # created in the same microsecond
+    stmt = select(PatientInteraction.__table__).order_by(
+        PatientInteraction.created_at.desc(), PatientInteraction.id.desc()
+    ).limit(limit)
+    if cursor is not None:
+        # UTCDateTime converts an offset-aware cursor to UTC when binding
+        if cursor_id is not None:
+            stmt = stmt.where(or_(
+                PatientInteraction.created_at < cursor,
+                and_(PatientInteraction.created_at == cursor, PatientInteraction.id < cursor_id)
+            ))
+        else:
+            stmt = stmt.where(PatientInteraction.created_at < cursor)
     
+    # Own session: the response body is produced after the route returns.
+    # The query runs and the first row is fetched here, so a failure can
+    # still become a 500 instead of an empty 200 body.
     db = SessionLocal()
     try:
-        interactions = db.query(PatientInteraction).order_by(PatientInteraction.created_at.desc()).all()
-        
-        return {
-            "success": True,
-            "count": len(interactions),
-            "interactions": [interaction.to_dict() for interaction in interactions],
-            "retrieved_at": datetime.now().isoformat()
-        }
+        rows = db.execute(stmt.execution_options(yield_per=200)).mappings()
+        first = rows.fetchone()
     except Exception as e:
-        print(f"❌ Error fetching interactions: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch interactions: {str(e)}")
-    finally:
         db.close()
+        logger.error("❌ Error fetching interactions: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch interactions: {str(e)}")
+    
+    def stream_rows():
+        # Errors past this point abort the response rather than truncating it quietly
+        try:
+            if first is not None:
+                yield orjson.dumps(dict(first)) + b"\n"
+                for row in rows:
+                    yield orjson.dumps(dict(row)) + b"\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
 
 @app.get("/hcps", tags=["HCPs"])
-async def get_hcps():
+async def get_hcps(db: Session = Depends(get_db)):
     """Get healthcare professionals from database"""
-    print("👨‍⚕️ Fetching HCP data...")
-    
-    from database import SessionLocal, HCPProfile
+    logger.debug("👨‍⚕️ Fetching HCP data...")
     
-    db = SessionLocal()
     try:
-        hcps = db.query(HCPProfile).all()
+        rows = db.execute(select(HCPProfile.__table__)).mappings().all()
         
         return {
             "success": True,
-            "count": len(hcps),
-            "hcps": [hcp.to_dict() for hcp in hcps],
-            "retrieved_at": datetime.now().isoformat()
+            "count": len(rows),
+            "hcps": [dict(row) for row in rows],
+            "retrieved_at": datetime.now(timezone.utc)
         }
     except Exception as e:
-        print(f"❌ Error fetching HCPs: {e}")
+        logger.error("❌ Error fetching HCPs: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch HCPs: {str(e)}")
-    finally:
-        db.close()
 
 @app.get("/test", tags=["Testing"])
-async def test_endpoint():
+async def test_endpoint(db: Session = Depends(get_db)):
     """Test endpoint to verify database connection"""
-    print("🧪 Testing database connection...")
+    logger.debug("🧪 Testing database connection...")
     
-    from database import SessionLocal, PatientInteraction, HCPProfile
-    
-    db = SessionLocal()
     try:
         interaction_count = db.query(PatientInteraction).count()
         hcp_count = db.query(HCPProfile).count()
@@ -195,18 +252,16 @@ async def test_endpoint():
             "error": str(e),
             "message": "Database test failed"
         }
-    finally:
-        db.close()
 
 if __name__ == "__main__":
-    print("=" * 60)
-    print("🚀 Starting Healthcare CRM API Server")
-    print("=" * 60)
-    print("🔗 API Documentation: http://localhost:8000/docs")
-    print("🌐 CORS enabled for: http://localhost:3000")
-    print("💾 Database: healthcare_crm.db")
-    print("🤖 AI Agent: Initialized and ready")
-    print("=" * 60)
+    logger.info("=" * 60)
+    logger.info("🚀 Starting Healthcare CRM API Server")
+    logger.info("=" * 60)
+    logger.info("🔗 API Documentation: http://localhost:8000/docs")
+    logger.info("🌐 CORS enabled for: http://localhost:3000")
+    logger.info("💾 Database: healthcare_crm.db")
+    logger.info("🤖 AI Agent: Initialized and ready")
+    logger.info("=" * 60)
     
     uvicorn.run(
         app,
@@ -214,43 +269,3 @@ if __name__ == "__main__":
         port=8000,
         log_level="info"
     )
-
-    # In main.py, update the /log-interaction endpoint:
-
-@app.post("/log-interaction", tags=["Interactions"])
-async def log_interaction(request: InteractionRequest):
-    """
-    Main endpoint for logging patient interactions
-    """
-    try:
-        print(f"📥 Received interaction request: {request.mode} mode")
-        
-        # Convert Pydantic model to dict for processing
-        request_data = request.dict()
-        
-        # Basic validation
-        if request.mode == 'chat' and not request.notes:
-            raise HTTPException(status_code=400, detail="Chat notes are required for chat mode")
-        
-        # Process through AI agent
-        print("🔍 Sending to AI agent...")
-        result = process_interaction(request_data)
-        
-        if not result.get("success", False):
-            error_msg = result.get("message") or result.get("error") or "Processing failed"
-            print(f"❌ Agent failed: {error_msg}")
-            raise HTTPException(status_code=500, detail=error_msg)
-        
-        print("✅ Agent processing successful")
-        return result
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"💥 Unhandled error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Internal server error: {str(e)}"
-        )
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+test_text_stats.py - Numba and pure-Python text stats must agree
+"""
+
+import pytest
+
+import text_stats
+
+SAMPLES = [
+    "",
+    "Patient presented with Fever and cough for 3 days. Headache, shortness of breath.",
+    "  a\tb\nc  ",
+    "fevers painful  backpain rash",
+    "Température élevée fever",
+    "Fever\u00a0cough\u2003headache painful",
+    "shortness of breath nausea\x1cvomiting\u3000rash",
+    "shortness\u00a0of breath",
+    "shortness of\u2003breath fever",
+]
+
+
+@pytest.mark.parametrize("notes", SAMPLES)
+def test_numba_matches_python_fallback(notes, monkeypatch):
+    if not text_stats.NUMBA_AVAILABLE:
+        pytest.skip("numba not installed")
+
+    numba_result = text_stats.count_words_and_symptoms(notes)
+    monkeypatch.setattr(text_stats, "NUMBA_AVAILABLE", False)
+    assert text_stats.count_words_and_symptoms(notes) == numba_result
+
+
+def test_unicode_whitespace_splits_words():
+    assert text_stats.count_words_and_symptoms("Fever\u00a0cough\u2003headache painful") == (4, 4)
+
+
+def test_unicode_whitespace_inside_multi_word_keyword():
+    assert text_stats.count_words_and_symptoms("shortness\u00a0of breath") == (3, 1)
+    assert text_stats.count_words_and_symptoms("shortness of\u2003breath fever") == (4, 2)
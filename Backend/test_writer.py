@@ -0,0 +1,49 @@
+"""
+test_writer.py - Batch writer latency and grouping
+"""
+
+import asyncio
+import time
+
+import writer
+
+
+def _recording_writer():
+    """Writer whose flush records batches instead of touching SQLite"""
+    batches = []
+    w = writer.InteractionBatchWriter()
+
+    def flush(rows):
+        batches.append(len(rows))
+        return [None] * len(rows)
+
+    w._flush = flush
+    return w, batches
+
+
+def test_lone_enqueue_settles_immediately():
+    async def run():
+        w, batches = _recording_writer()
+        w.start()
+        started = time.perf_counter()
+        await w.enqueue({"id": "a"})
+        elapsed = time.perf_counter() - started
+        await w.stop()
+        return elapsed, batches
+
+    elapsed, batches = asyncio.run(run())
+    # The old 50 ms batching window must not come back
+    assert elapsed < 0.02
+    assert batches == [1]
+
+
+def test_queued_rows_share_one_batch():
+    async def run():
+        w, batches = _recording_writer()
+        w.start()
+        futures = [w.enqueue({"id": str(i)}) for i in range(5)]
+        await asyncio.gather(*futures)
+        await w.stop()
+        return batches
+
+    assert asyncio.run(run()) == [5]
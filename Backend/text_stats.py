@@ -0,0 +1,114 @@
+"""
+text_stats.py - Clinical notes text statistics
+Word and symptom-keyword counts in one pass (Numba optional)
+"""
+
+from typing import Tuple
+import logging
+import re
+
+logger = logging.getLogger("crm")
+
+SYMPTOM_KEYWORDS = (
+    "fever",
+    "cough",
+    "headache",
+    "pain",
+    "fatigue",
+    "nausea",
+    "vomiting",
+    "dizziness",
+    "rash",
+    "shortness of breath"
+)
+
+# Try to import Numba, but make it optional
+try:
+    import numpy as np
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("⚠️  numba not installed, using pure-Python text stats")
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _count_words_and_symptoms(buf, keywords, keyword_offsets):
+        """Count whitespace-separated words and keywords starting at a word boundary"""
+        n = buf.shape[0]
+        words = 0
+        hits = 0
+        in_word = False
+
+        for i in range(n):
+            c = buf[i]
+            # Same ASCII whitespace set as str.split()
+            if c == 32 or (c >= 9 and c <= 13) or (c >= 28 and c <= 31):
+                in_word = False
+                continue
+
+            if in_word:
+                continue
+
+            in_word = True
+            words += 1
+
+            for k in range(keyword_offsets.shape[0] - 1):
+                start = keyword_offsets[k]
+                length = keyword_offsets[k + 1] - start
+                if i + length > n:
+                    continue
+
+                matched = True
+                for j in range(length):
+                    if buf[i + j] != keywords[start + j]:
+                        matched = False
+                        break
+
+                if matched:
+                    hits += 1
+
+        return words, hits
+
+    # Keywords packed into one byte array, with offsets marking each keyword
+    _KEYWORD_BYTES = np.frombuffer("".join(SYMPTOM_KEYWORDS).encode(), dtype=np.uint8)
+    _KEYWORD_OFFSETS = np.cumsum([0] + [len(k) for k in SYMPTOM_KEYWORDS]).astype(np.int64)
+
+    # Warm up once at import so the first request doesn't pay the JIT cost
+    _count_words_and_symptoms(np.frombuffer(b"warm up fever", dtype=np.uint8), _KEYWORD_BYTES, _KEYWORD_OFFSETS)
+
+
+_SYMPTOM_PATTERN = re.compile(
+    r"(?<!\S)(?:" + "|".join(re.escape(k) for k in SYMPTOM_KEYWORDS) + ")"
+)
+
+# Any Unicode whitespace (NBSP, em space, ...) - the same set str.split() uses
+_UNICODE_WHITESPACE = re.compile(r"\s")
+
+
+def _count_words_and_symptoms_py(text: str) -> Tuple[int, int]:
+    """Pure-Python fallback over already-lowercased text"""
+    return len(text.split()), len(_SYMPTOM_PATTERN.findall(text))
+
+
+def count_words_and_symptoms(notes: str) -> Tuple[int, int]:
+    """
+    Return (word_count, symptom_mentions) for clinical notes
+    Symptom mentions are case-insensitive keyword hits at the start of a word
+    """
+    text = notes.lower()
+
+    # Pasted notes often carry NBSP and friends: the kernel only knows ASCII
+    # whitespace and multi-word keywords are matched with literal spaces
+    if not text.isascii():
+        text = _UNICODE_WHITESPACE.sub(" ", text)
+
+    if NUMBA_AVAILABLE:
+        buf = np.frombuffer(text.encode(), dtype=np.uint8)
+        words, hits = _count_words_and_symptoms(buf, _KEYWORD_BYTES, _KEYWORD_OFFSETS)
+        return int(words), int(hits)
+
+    return _count_words_and_symptoms_py(text)
@@ -5,71 +5,95 @@ Database operations layer
 
 from datetime import datetime
 from typing import Dict, Any, Optional
-from database import SessionLocal, PatientInteraction, HCPProfile
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from database import PatientInteraction, HCPProfile, utcnow
+from writer import interaction_writer
 import json
+import logging
+import uuid
 
+logger = logging.getLogger("crm")
 
-# ----------------- TOOL 1 -----------------
 
-def log_interaction_tool(interaction_data: Dict[str, Any]) -> Dict[str, Any]:
+# ----------------- TOOL 1 -----------------
 
-    print("\n🛠 LOG INTERACTION TOOL")
+def log_interaction_tool(db: Session, interaction_data: Dict[str, Any]) -> Dict[str, Any]:
 
-    db = SessionLocal()
+    logger.debug("🛠 LOG INTERACTION TOOL")
 
     try:
         mode = interaction_data.get("mode", "form")
 
-        new_interaction = PatientInteraction()
+        now = utcnow()
+
+        # Every column is set here, including the id, so rows from both modes
+        # can share one batched INSERT and the id is known before the write lands
+        new_interaction = {
+            "id": str(uuid.uuid4()),
+            "patient_id": None,
+            "interaction_type": "consultation",
+            "interaction_date": now,
+            "duration_minutes": None,
+            "symptoms": None,
+            "diagnosis": None,
+            "prescription": None,
+            "follow_up_date": None,
+            "chat_notes": None,
+            "is_compliant": False,
+            "created_at": now,
+            "updated_at": now
+        }
 
         if mode == "chat":
 
-            new_interaction.chat_notes = interaction_data.get("notes", "")
-            new_interaction.interaction_type = "consultation"
-            new_interaction.duration_minutes = 30
+            new_interaction["chat_notes"] = interaction_data.get("notes", "")
+            new_interaction["duration_minutes"] = 30
 
         else:
 
-            new_interaction.patient_id = interaction_data.get("patient_id")
-            new_interaction.symptoms = interaction_data.get("symptoms")
-            new_interaction.diagnosis = interaction_data.get("diagnosis")
-            new_interaction.prescription = interaction_data.get("prescription")
-            new_interaction.duration_minutes = interaction_data.get("duration", 20)
+            new_interaction["patient_id"] = interaction_data.get("patient_id")
+            new_interaction["symptoms"] = interaction_data.get("symptoms")
+            new_interaction["diagnosis"] = interaction_data.get("diagnosis")
+            new_interaction["prescription"] = interaction_data.get("prescription")
+            new_interaction["duration_minutes"] = interaction_data.get("duration", 20)
 
-        db.add(new_interaction)
-        db.commit()
-        db.refresh(new_interaction)
+        # Group-committed by the background writer; the caller must await
+        # pending_write before acknowledging. Direct insert when the writer
+        # is down or its queue is full.
+        pending_write = interaction_writer.enqueue(new_interaction) if interaction_writer.running else None
 
-        print("✅ Interaction Saved:", new_interaction.id)
+        if pending_write is not None:
+            logger.info("✅ Interaction Queued: %s", new_interaction["id"])
+        else:
+            db.execute(insert(PatientInteraction), [new_interaction])
+            db.commit()
+            logger.info("✅ Interaction Saved: %s", new_interaction["id"])
 
         return {
             "success": True,
-            "interaction_id": new_interaction.id,
-            "data": new_interaction.to_dict()
+            "interaction_id": new_interaction["id"],
+            "data": new_interaction,
+            "pending_write": pending_write
         }
 
     except Exception as e:
 
         db.rollback()
 
-        print("❌ DB Error:", e)
+        logger.error("❌ DB Error: %s", e)
 
         return {
             "success": False,
             "error": str(e)
         }
 
-    finally:
-        db.close()
-
 
 # ----------------- TOOL 2 -----------------
 
-def edit_interaction_tool(updates: Dict[str, Any]) -> Dict[str, Any]:
+def edit_interaction_tool(db: Session, updates: Dict[str, Any]) -> Dict[str, Any]:
 
-    print("\n🛠 EDIT INTERACTION TOOL")
-
-    db = SessionLocal()
+    logger.debug("🛠 EDIT INTERACTION TOOL")
 
     try:
 
@@ -86,7 +110,7 @@ def edit_interaction_tool(updates: Dict[str, Any]) -> Dict[str, Any]:
         if "prescription" in updates:
             last.prescription = updates["prescription"]
 
-        last.updated_at = datetime.utcnow()
+        last.updated_at = utcnow()
 
         db.commit()
         db.refresh(last)
@@ -102,57 +126,47 @@ def edit_interaction_tool(updates: Dict[str, Any]) -> Dict[str, Any]:
 
         return {"success": False, "error": str(e)}
 
-    finally:
-        db.close()
-
 
 # ----------------- TOOL 3 -----------------
 
-def fetch_hcp_tool(query: Optional[Dict[str, Any]] = None):
+def fetch_hcp_tool(db: Session, query: Optional[Dict[str, Any]] = None):
 
-    print("\n🛠 FETCH HCP TOOL")
-
-    db = SessionLocal()
+    logger.debug("🛠 FETCH HCP TOOL")
 
     try:
 
-        hcps = db.query(HCPProfile).all()
+        rows = db.execute(select(HCPProfile.__table__)).mappings().all()
 
         return {
             "success": True,
-            "count": len(hcps),
-            "data": [hcp.to_dict() for hcp in hcps]
+            "count": len(rows),
+            "data": [dict(row) for row in rows]
         }
 
     except Exception as e:
 
         return {"success": False, "error": str(e)}
 
-    finally:
-        db.close()
-
 
 # ----------------- TOOL 4 -----------------
 
-def followup_tool(interaction_id: str, followup_date: str):
+def followup_tool(db: Session, interaction_id: str, followup_date: str):
 
-    print("\n🛠 FOLLOWUP TOOL")
-
-    db = SessionLocal()
+    logger.debug("🛠 FOLLOWUP TOOL")
 
     try:
 
-        interaction = db.query(PatientInteraction)\
-                        .filter(PatientInteraction.id == interaction_id)\
-                        .first()
+        # Single UPDATE by primary key - no SELECT round trip first
+        result = db.execute(
+            update(PatientInteraction)
+            .where(PatientInteraction.id == interaction_id)
+            .values(follow_up_date=datetime.fromisoformat(followup_date))
+        )
 
-        if not interaction:
+        if result.rowcount == 0:
             return {"success": False, "message": "Not found"}
 
-        interaction.follow_up_date = datetime.fromisoformat(followup_date)
-
         db.commit()
-        db.refresh(interaction)
 
         return {"success": True}
 
@@ -161,25 +175,23 @@ def followup_tool(interaction_id: str, followup_date: str):
         db.rollback()
         return {"success": False, "error": str(e)}
 
-    finally:
-        db.close()
-
 
 # ----------------- TOOL 5 -----------------
 
-def compliance_tool(interaction_id: str, is_compliant: bool):
-
-    print("\n🛠 COMPLIANCE TOOL")
+def compliance_tool(db: Session, interaction_id: str, is_compliant: bool):
 
-    db = SessionLocal()
+    logger.debug("🛠 COMPLIANCE TOOL")
 
     try:
 
-        interaction = db.query(PatientInteraction)\
-                        .filter(PatientInteraction.id == interaction_id)\
-                        .first()
+        result = db.execute(
+            update(PatientInteraction)
+            .where(PatientInteraction.id == interaction_id)
+            .values(is_compliant=is_compliant)
+        )
 
-        interaction.is_compliant = is_compliant
+        if result.rowcount == 0:
+            return {"success": False, "message": "Not found"}
 
         db.commit()
 
@@ -190,9 +202,6 @@ def compliance_tool(interaction_id: str, is_compliant: bool):
         db.rollback()
         return {"success": False, "error": str(e)}
 
-    finally:
-        db.close()
-
 
 # ----------------- TOOL REGISTRY -----------------
 
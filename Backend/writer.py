@@ -0,0 +1,135 @@
+"""
+writer.py - Batched background writer for new interactions
+Groups queued rows into one multi-row INSERT and one commit per batch
+"""
+
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+
+from sqlalchemy import insert
+
+from database import SessionLocal, PatientInteraction
+
+logger = logging.getLogger("crm")
+
+
+class InteractionBatchWriter:
+    """
+    Drains up to max_batch rows already waiting in the queue and writes them
+    in a single transaction. A lone row is flushed at once; rows arriving
+    while a flush is in progress form the next batch.
+    Every queued row gets a future that resolves once its row is committed,
+    or fails with the error that kept it out of the database.
+    """
+
+    def __init__(self, max_batch: int = 100, max_queue: int = 1000):
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopping = False
+
+    @property
+    def running(self) -> bool:
+        return not self.stopping and self.task is not None and not self.task.done()
+
+    def start(self):
+        """Start the flusher on the running event loop (app startup)"""
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.stopping = False
+        self.task = asyncio.create_task(self._run())
+        logger.info("🗃  Interaction batch writer started")
+
+    async def stop(self):
+        """Flush everything still queued, then stop (app shutdown)"""
+        if not self.running:
+            return
+        # No new rows after the sentinel, or their futures would never resolve
+        self.stopping = True
+        await self.queue.put(None)
+        await self.task
+        logger.info("🗃  Interaction batch writer stopped")
+
+    def enqueue(self, row: Dict[str, Any]) -> Optional[asyncio.Future]:
+        """
+        Queue a row and return a future for its commit
+        Returns None when the queue is full; the caller should write directly
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            return None
+        return future
+
+    async def _run(self):
+        stopping = False
+
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+
+            # No batching window: callers wait on the commit, so only take
+            # what is already queued
+            while len(batch) < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            rows = [row for row, _ in batch]
+            try:
+                # SQLite I/O off the event loop
+                errors = await asyncio.to_thread(self._flush, rows)
+            except Exception as e:
+                errors = [e] * len(rows)
+
+            # Futures belong to the loop, so they are settled here, not in the thread
+            for (_, future), error in zip(batch, errors):
+                if future.done():
+                    # Caller went away (request cancelled); the row is still written
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Insert rows in one transaction and return one error (or None) per row
+        If the batch fails, rows are retried one by one so a single bad row
+        only fails its own request
+        """
+        db = SessionLocal()
+        try:
+            try:
+                db.execute(insert(PatientInteraction), rows)
+                db.commit()
+                logger.debug("✅ Flushed %d interactions", len(rows))
+                return [None] * len(rows)
+            except Exception as e:
+                db.rollback()
+                logger.warning("⚠️  Batch of %d interactions failed: %s, retrying row by row", len(rows), e)
+
+            errors: List[Optional[Exception]] = []
+            for row in rows:
+                try:
+                    db.execute(insert(PatientInteraction), [row])
+                    db.commit()
+                    errors.append(None)
+                except Exception as e:
+                    db.rollback()
+                    logger.error("❌ Failed to save interaction %s: %s", row["id"], e)
+                    errors.append(e)
+            return errors
+        finally:
+            db.close()
+
+
+# Global writer instance, started and stopped by the FastAPI lifespan
+interaction_writer = InteractionBatchWriter()